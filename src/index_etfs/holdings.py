@@ -1,5 +1,6 @@
 """📊 Extract ticker symbols from index ETFs."""
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import polars as pl
@@ -35,12 +36,16 @@ def main() -> None:
     output_dir = Path.cwd()
     results = {}
 
-    for symbol in ETF_CONFIGS:
-        print(f"  ⏳ Processing {symbol.upper()}...")
-        df = get_etf_holdings(symbol, output_dir)
-        count = len(df)
-        results[symbol] = count
-        print(f"  ✅ {symbol.upper()} complete! ({count} rows)")
+    with ThreadPoolExecutor(max_workers=len(ETF_CONFIGS)) as executor:
+        futures = {}
+        for symbol in ETF_CONFIGS:
+            print(f"  ⏳ Processing {symbol.upper()}...")
+            futures[symbol] = executor.submit(get_etf_holdings, symbol, output_dir)
+
+        for symbol, future in futures.items():
+            count = len(future.result())
+            results[symbol] = count
+            print(f"  ✅ {symbol.upper()} complete! ({count} rows)")
 
     write_metadata(results, output_dir)
     print("🎉 All holdings downloaded successfully!")
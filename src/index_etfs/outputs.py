@@ -9,7 +9,7 @@ from pathlib import Path
 import polars as pl
 
 from .catalog import ETF_CONFIGS, MIN_EXPECTED_RATIO
-from .sources import FIREFOX_HEADERS
+from .sources import FIREFOX_HEADERS, SSL_CONTEXT
 
 TRADINGVIEW_SCAN_URL = "https://scanner.tradingview.com/america/scan"
 
@@ -59,7 +59,7 @@ def _scan_tradingview(tickers: list[str]) -> list[dict]:
             "Referer": "https://www.tradingview.com/",
         },
     )
-    with urllib.request.urlopen(request, timeout=30) as response:
+    with urllib.request.urlopen(request, timeout=30, context=SSL_CONTEXT) as response:
         return json.load(response).get("data", [])
 
 
@@ -100,7 +100,8 @@ def grouped_watchlist_lines(tickers: list[str], symbols: dict[str, tuple[str, st
 
 def _write_lines(path: Path, lines: list[str]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text("\n".join(lines) + "\n")
+    with path.open("w") as f:
+        f.writelines(f"{line}\n" for line in lines)
 
 
 def _save_watchlist(tickers: list[str], watchlist_name: str, output_dir: Path) -> None:
@@ -1,8 +1,17 @@
 """Download and clean holdings data from upstream providers."""
 
+import functools
+import hashlib
 import io
 import json
+import os
+import ssl
+import tempfile
+import urllib.error
 import urllib.request
+from collections.abc import Callable
+from http import HTTPStatus
+from pathlib import Path
 
 import polars as pl
 
@@ -14,29 +23,114 @@ FIREFOX_HEADERS = {
     "Accept-Language": "en-US,en;q=0.5",
 }
 
+SSL_CONTEXT = ssl.create_default_context()
+
+ISHARES_SCHEMA = {
+    "Ticker": pl.String,
+    "Name": pl.String,
+    "Market Currency": pl.String,
+}
+
+BAD_TICKERS = ("", "-")
+
+
+def _default_cache_dir() -> Path:
+    """Follow XDG: an unset or empty XDG_CACHE_HOME means ~/.cache."""
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "index-etfs"
+
+
+CACHE_DIR = _default_cache_dir()
+
+
+def _cache_paths(url: str) -> tuple[Path, Path]:
+    key = hashlib.sha256(url.encode()).hexdigest()
+    return CACHE_DIR / f"{key}.body", CACHE_DIR / f"{key}.json"
+
+
+def _read_cache_meta(meta_path: Path) -> dict:
+    """Return cached validators, treating a missing or corrupt file as a miss."""
+    try:
+        meta = json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def _replace_file(path: Path, data: bytes) -> None:
+    """Write via a temp file in the same directory so readers never see a partial file."""
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+@functools.cache
+def _download(url: str) -> bytes:
+    """Download a URL once per process, revalidating any on-disk copy."""
+    body_path, meta_path = _cache_paths(url)
+    headers = dict(FIREFOX_HEADERS)
+    if body_path.exists():
+        meta = _read_cache_meta(meta_path)
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=30, context=SSL_CONTEXT) as response:
+            body = response.read()
+            meta = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+    except urllib.error.HTTPError as exc:
+        if exc.code == HTTPStatus.NOT_MODIFIED and body_path.exists():
+            return body_path.read_bytes()
+        raise
+
+    if meta["etag"] or meta["last_modified"]:
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _replace_file(body_path, body)
+            _replace_file(meta_path, json.dumps(meta).encode())
+        except OSError:
+            pass  # The cache is only an optimization; keep the fresh body.
+    return body
+
 
 def read_url(url: str) -> io.BytesIO:
-    """Read a URL with browser-ish headers."""
-    request = urllib.request.Request(url, headers=FIREFOX_HEADERS)
-    with urllib.request.urlopen(request, timeout=30) as response:
-        return io.BytesIO(response.read())
+    """Read a URL into a fresh in-memory buffer."""
+    return io.BytesIO(_download(url))
 
 
 def load_ssga_excel(url: str) -> pl.DataFrame:
     """Load SSGA Excel format holdings data."""
-    df_dict = pl.read_excel(read_url(url), sheet_id=0, read_options={"header_row": 4})
-    return list(df_dict.values())[0] if isinstance(df_dict, dict) else df_dict
+    return pl.read_excel(
+        read_url(url),
+        sheet_id=1,
+        engine="calamine",
+        read_options={"header_row": 4},
+    )
 
 
 def load_ishares_csv(url: str) -> pl.DataFrame:
     """Load iShares CSV format holdings data."""
-    df = pl.read_csv(
-        read_url(url),
-        skip_rows=9,
-        columns=["Ticker", "Name", "Weight (%)", "Market Currency"],
-        truncate_ragged_lines=True,
+    return (
+        pl.scan_csv(
+            read_url(url),
+            skip_rows=9,
+            schema_overrides=ISHARES_SCHEMA,
+            truncate_ragged_lines=True,
+        )
+        .select("Ticker", "Name", "Weight (%)", "Market Currency")
+        .rename({"Weight (%)": "Weight"})
+        .collect()
     )
-    return df.rename({"Weight (%)": "Weight"})
 
 
 def load_nasdaq_json(url: str) -> pl.DataFrame:
@@ -52,15 +146,22 @@ def load_nasdaq_json(url: str) -> pl.DataFrame:
     return pl.DataFrame({"Ticker": tickers})
 
 
+PROVIDER_LOADERS: dict[Provider, Callable[[str], pl.DataFrame]] = {
+    "ssga": load_ssga_excel,
+    "ishares": load_ishares_csv,
+    "nasdaq": load_nasdaq_json,
+}
+
+CURRENCY_COLUMNS: dict[Provider, str] = {
+    "ssga": "Local Currency",
+    "ishares": "Market Currency",
+}
+
+
 def load_holdings(config: ETFConfig) -> pl.DataFrame:
     """Load holdings from the configured provider."""
-    loaders = {
-        "ssga": load_ssga_excel,
-        "ishares": load_ishares_csv,
-        "nasdaq": load_nasdaq_json,
-    }
     try:
-        loader = loaders[config.provider]
+        loader = PROVIDER_LOADERS[config.provider]
     except KeyError as exc:
         raise ValueError(f"Unknown provider: {config.provider}") from exc
     return loader(config.url)
@@ -71,14 +172,14 @@ def filter_and_clean(df: pl.DataFrame, provider: Provider) -> pl.DataFrame:
     if len(df) == 0:
         return df.select("Ticker") if "Ticker" in df.columns else pl.DataFrame({"Ticker": []})
 
-    if provider in ("ssga", "ishares"):
-        currency_col = "Local Currency" if provider == "ssga" else "Market Currency"
-        df = df.filter((pl.col(currency_col) == "USD") & (pl.col("Ticker") != "-"))
-
-    return df.filter(
-        pl.col("Ticker").is_not_null()
-        & (pl.col("Ticker") != "")
-        & (pl.col("Ticker") != "-")
-        & ~pl.col("Ticker").str.contains("_", literal=True)
-        & ~pl.col("Ticker").str.contains(" ", literal=True)
-    ).select("Ticker").sort("Ticker")
+    ticker = pl.col("Ticker")
+    predicate = (
+        ticker.is_not_null()
+        & ~ticker.is_in(BAD_TICKERS)
+        & ~ticker.str.contains("_", literal=True)
+        & ~ticker.str.contains(" ", literal=True)
+    )
+    if currency_col := CURRENCY_COLUMNS.get(provider):
+        predicate &= pl.col(currency_col) == "USD"
+
+    return df.lazy().filter(predicate).select("Ticker").sort("Ticker").collect()
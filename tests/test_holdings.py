@@ -2,14 +2,20 @@
 
 import io
 import json
+import urllib.error
+import urllib.request
+import urllib.response
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+from unittest.mock import MagicMock
 
 import polars as pl
 import pytest
 
 import index_etfs.catalog as catalog
 import index_etfs.holdings as holdings
+import index_etfs.outputs as outputs
+import index_etfs.sources as sources
 from index_etfs.catalog import ETFConfig, validate_count
 from index_etfs.holdings import get_etf_holdings
 from index_etfs.outputs import (
@@ -20,7 +26,12 @@ from index_etfs.outputs import (
     write_metadata,
 )
 from index_etfs.sources import (
+    CURRENCY_COLUMNS,
     FIREFOX_HEADERS,
+    PROVIDER_LOADERS,
+    SSL_CONTEXT,
+    _default_cache_dir,
+    _download,
     filter_and_clean,
     load_holdings,
     load_ishares_csv,
@@ -31,6 +42,14 @@ from index_etfs.sources import (
 
 
 @pytest.fixture
+def holdings_mocks(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    mocks = SimpleNamespace(read_url=MagicMock(), tradingview_symbols=MagicMock(return_value={}))
+    monkeypatch.setattr(sources, "read_url", mocks.read_url)
+    monkeypatch.setattr(outputs, "tradingview_symbols", mocks.tradingview_symbols)
+    return mocks
+
+
+@pytest.fixture(scope="module")
 def sample_ssga_data() -> pl.DataFrame:
     return pl.DataFrame(
         {
@@ -38,11 +57,12 @@ def sample_ssga_data() -> pl.DataFrame:
             "Name": ["Apple Inc", "Microsoft", "Alphabet", "Cash", "NVIDIA"],
             "Weight": [7.5, 6.2, 4.1, 0.5, 3.8],
             "Local Currency": ["USD", "USD", "USD", "USD", "EUR"],
-        }
+        },
+        schema={"Ticker": pl.String, "Name": pl.String, "Weight": pl.Float64, "Local Currency": pl.String},
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_ishares_data() -> pl.DataFrame:
     return pl.DataFrame(
         {
@@ -50,20 +70,26 @@ def sample_ishares_data() -> pl.DataFrame:
             "Name": ["Apple Inc", "Microsoft", "Cash", "Alphabet"],
             "Weight": [2.5, 2.0, 0.1, 1.8],
             "Market Currency": ["USD", "USD", "USD", "GBP"],
-        }
+        },
+        schema={"Ticker": pl.String, "Name": pl.String, "Weight": pl.Float64, "Market Currency": pl.String},
     )
 
 
+@pytest.fixture(scope="module")
+def sample_nasdaq_data() -> pl.DataFrame:
+    return pl.DataFrame({"Ticker": ["MSFT", "", "AAPL", "GOOGL"]}, schema={"Ticker": pl.String})
+
+
 @pytest.mark.parametrize(
     ("provider", "rows", "expected"),
     [
         ("ssga", "sample_ssga_data", ["AAPL", "GOOGL", "MSFT"]),
         ("ishares", "sample_ishares_data", ["AAPL", "MSFT"]),
-        ("nasdaq", None, ["AAPL", "GOOGL", "MSFT"]),
+        ("nasdaq", "sample_nasdaq_data", ["AAPL", "GOOGL", "MSFT"]),
     ],
 )
-def test_filter_and_clean(provider: str, rows: str | None, expected: list[str], request: pytest.FixtureRequest) -> None:
-    df = request.getfixturevalue(rows) if rows else pl.DataFrame({"Ticker": ["MSFT", "", "AAPL", "GOOGL"]})
+def test_filter_and_clean(provider: str, rows: str, expected: list[str], request: pytest.FixtureRequest) -> None:
+    df = request.getfixturevalue(rows)
 
     assert filter_and_clean(df, provider).to_dict(as_series=False) == {"Ticker": expected}
 
@@ -74,29 +100,34 @@ def test_filter_and_clean_handles_empty_dataframe() -> None:
     assert result.to_dict(as_series=False) == {"Ticker": []}
 
 
-@patch("index_etfs.sources.read_url", return_value=io.BytesIO())
-@patch("index_etfs.sources.pl.read_excel")
-def test_load_ssga_excel_handles_polars_shapes(mock_read_excel: MagicMock, _mock_read_url: MagicMock) -> None:
+def test_load_ssga_excel_reads_first_sheet(holdings_mocks: SimpleNamespace, monkeypatch: pytest.MonkeyPatch) -> None:
     df = pl.DataFrame({"Ticker": ["AAPL"]})
-    mock_read_excel.side_effect = [{"Sheet1": df}, df]
+    mock_read_excel = MagicMock(return_value=df)
+    monkeypatch.setattr(sources.pl, "read_excel", mock_read_excel)
 
     assert load_ssga_excel("https://example.com/file.xlsx").equals(df)
-    assert load_ssga_excel("https://example.com/file.xlsx").equals(df)
+    assert mock_read_excel.call_args.args[0] is holdings_mocks.read_url.return_value
+    assert mock_read_excel.call_args.kwargs["sheet_id"] == 1
+    assert mock_read_excel.call_args.kwargs["engine"] == "calamine"
 
 
-@patch("index_etfs.sources.read_url", return_value=io.BytesIO())
-@patch("index_etfs.sources.pl.read_csv")
-def test_load_ishares_csv_renames_weight(mock_read_csv: MagicMock, _mock_read_url: MagicMock) -> None:
-    mock_read_csv.return_value = pl.DataFrame(
-        {"Ticker": ["AAPL"], "Name": ["Apple"], "Weight (%)": [5.0], "Market Currency": ["USD"]}
-    )
+def test_load_ishares_csv_renames_weight(holdings_mocks: SimpleNamespace) -> None:
+    csv = b"preamble\n" * 9 + b"Ticker,Name,Sector,Weight (%),Market Currency\nAAPL,Apple,IT,5.0,USD\n"
+    holdings_mocks.read_url.return_value = io.BytesIO(csv)
+
+    assert load_ishares_csv("https://example.com/file.csv").to_dict(as_series=False) == {
+        "Ticker": ["AAPL"],
+        "Name": ["Apple"],
+        "Weight": [5.0],
+        "Market Currency": ["USD"],
+    }
+
 
-    assert load_ishares_csv("https://example.com/file.csv").columns == [
-        "Ticker",
-        "Name",
-        "Weight",
-        "Market Currency",
-    ]
+def test_load_ishares_csv_tolerates_placeholder_weights(holdings_mocks: SimpleNamespace) -> None:
+    csv = b"preamble\n" * 9 + b"Ticker,Name,Sector,Weight (%),Market Currency\nAAPL,Apple,IT,5.0,USD\n-,Cash,Cash,-,USD\n"
+    holdings_mocks.read_url.return_value = io.BytesIO(csv)
+
+    assert filter_and_clean(load_ishares_csv("https://example.com/file.csv"), "ishares")["Ticker"].to_list() == ["AAPL"]
 
 
 @pytest.mark.parametrize(
@@ -107,19 +138,89 @@ def test_load_ishares_csv_renames_weight(mock_read_csv: MagicMock, _mock_read_ur
         (b'{"data":{"data":{"rows":[{}]}}}', "symbols"),
     ],
 )
-def test_load_nasdaq_json(payload: bytes, match: str | None) -> None:
-    with patch("index_etfs.sources.read_url", return_value=io.BytesIO(payload)):
-        if match:
-            with pytest.raises(ValueError, match=match):
-                load_nasdaq_json("https://example.com/data.json")
-        else:
-            assert load_nasdaq_json("https://example.com/data.json")["Ticker"].to_list() == ["AAPL", "BRK.B"]
+def test_load_nasdaq_json(payload: bytes, match: str | None, holdings_mocks: SimpleNamespace) -> None:
+    holdings_mocks.read_url.return_value = io.BytesIO(payload)
+
+    if match:
+        with pytest.raises(ValueError, match=match):
+            load_nasdaq_json("https://example.com/data.json")
+    else:
+        assert load_nasdaq_json("https://example.com/data.json")["Ticker"].to_list() == ["AAPL", "BRK.B"]
 
 
-@patch("index_etfs.sources.urllib.request.urlopen", return_value=io.BytesIO(b"ok"))
-def test_read_url_uses_headers(mock_urlopen: MagicMock) -> None:
+@pytest.fixture
+def download_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(sources, "CACHE_DIR", tmp_path)
+    _download.cache_clear()
+    return tmp_path
+
+
+def _response(body: bytes, headers: dict[str, str] | None = None) -> urllib.response.addinfourl:
+    return urllib.response.addinfourl(io.BytesIO(body), headers or {}, "https://example.com", 200)
+
+
+def test_read_url_uses_headers(download_cache: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    mock_urlopen = MagicMock(return_value=_response(b"ok"))
+    monkeypatch.setattr(sources.urllib.request, "urlopen", mock_urlopen)
+
+    assert read_url("https://example.com/data.csv").read() == b"ok"
     assert read_url("https://example.com/data.csv").read() == b"ok"
+
+    assert mock_urlopen.call_count == 1
     assert mock_urlopen.call_args.args[0].get_header("User-agent") == FIREFOX_HEADERS["User-Agent"]
+    assert mock_urlopen.call_args.kwargs["context"] is SSL_CONTEXT
+    assert not list(download_cache.iterdir())
+
+
+@pytest.mark.usefixtures("download_cache")
+def test_read_url_revalidates_disk_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    url = "https://example.com/holdings.xlsx"
+    not_modified = urllib.error.HTTPError(url, 304, "Not Modified", {}, None)  # type: ignore[arg-type]
+    server_error = urllib.error.HTTPError(url, 500, "Server Error", {}, None)  # type: ignore[arg-type]
+    mock_urlopen = MagicMock(side_effect=[_response(b"fresh", {"ETag": '"v1"'}), not_modified, server_error])
+    monkeypatch.setattr(sources.urllib.request, "urlopen", mock_urlopen)
+
+    for _ in range(2):
+        _download.cache_clear()
+        assert read_url(url).read() == b"fresh"
+
+    _download.cache_clear()
+    with pytest.raises(urllib.error.HTTPError):
+        read_url(url)
+
+    assert mock_urlopen.call_args_list[1].args[0].get_header("If-none-match") == '"v1"'
+
+
+def test_read_url_ignores_unwritable_cache(download_cache: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    blocker = download_cache / "not-a-dir"
+    blocker.write_text("")
+    monkeypatch.setattr(sources, "CACHE_DIR", blocker / "index-etfs")
+    monkeypatch.setattr(sources.urllib.request, "urlopen", MagicMock(return_value=_response(b"ok", {"ETag": '"v1"'})))
+
+    assert read_url("https://example.com/holdings.csv").read() == b"ok"
+
+
+def test_read_url_treats_corrupt_cache_meta_as_miss(download_cache: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    url = "https://example.com/holdings.xlsx"
+    body_path, meta_path = sources._cache_paths(url)
+    body_path.write_bytes(b"stale")
+    meta_path.write_text('{"etag": "\\"v')
+    mock_urlopen = MagicMock(return_value=_response(b"fresh", {"ETag": '"v2"'}))
+    monkeypatch.setattr(sources.urllib.request, "urlopen", mock_urlopen)
+
+    assert read_url(url).read() == b"fresh"
+    assert not mock_urlopen.call_args.args[0].has_header("If-none-match")
+    assert body_path.read_bytes() == b"fresh"
+    assert json.loads(meta_path.read_text())["etag"] == '"v2"'
+    assert sorted(download_cache.iterdir()) == sorted([body_path, meta_path])
+
+
+@pytest.mark.parametrize("xdg_cache_home", ["", "/tmp/xdg"])
+def test_cache_dir_honors_xdg_cache_home(xdg_cache_home: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", xdg_cache_home)
+
+    expected = Path(xdg_cache_home or Path.home() / ".cache") / "index-etfs"
+    assert _default_cache_dir() == expected
 
 
 def test_load_holdings_rejects_unknown_provider() -> None:
@@ -127,17 +228,17 @@ def test_load_holdings_rejects_unknown_provider() -> None:
         load_holdings(ETFConfig("https://example.com/data", "bad", "bad", 1))  # type: ignore[arg-type]
 
 
-@patch(
-    "index_etfs.outputs.urllib.request.urlopen",
-    return_value=io.BytesIO(
-        b'{"data":[{"s":"NASDAQ:AAPL","d":["AAPL","Technology Services"]}]}'
-    ),
-)
-def test_tradingview_symbols(mock_urlopen: MagicMock) -> None:
+def test_tradingview_symbols(monkeypatch: pytest.MonkeyPatch) -> None:
+    mock_urlopen = MagicMock(
+        return_value=io.BytesIO(b'{"data":[{"s":"NASDAQ:AAPL","d":["AAPL","Technology Services"]}]}')
+    )
+    monkeypatch.setattr(outputs.urllib.request, "urlopen", mock_urlopen)
+
     assert tradingview_symbols(["AAPL"]) == {"AAPL": ("NASDAQ:AAPL", "Technology Services")}
     request = mock_urlopen.call_args.args[0]
     assert request.get_header("Content-type") == "application/json"
     assert json.loads(request.data)["columns"] == ["name", "sector"]
+    assert mock_urlopen.call_args.kwargs["context"] is SSL_CONTEXT
 
 
 def test_tradingview_symbols_rejects_invalid_chunk_size() -> None:
@@ -159,8 +260,9 @@ def test_grouped_watchlist_lines_groups_by_header() -> None:
     ) == ["###Other", "BRK.B", "###Technology", "NASDAQ:AAPL", "NASDAQ:MSFT"]
 
 
-@patch("index_etfs.outputs.tradingview_symbols", return_value={"AAPL": ("NASDAQ:AAPL", "Technology")})
-def test_save_holdings_writes_outputs(_mock_symbols: MagicMock, tmp_path: Path) -> None:
+def test_save_holdings_writes_outputs(holdings_mocks: SimpleNamespace, tmp_path: Path) -> None:
+    holdings_mocks.tradingview_symbols.return_value = {"AAPL": ("NASDAQ:AAPL", "Technology")}
+
     save_holdings(pl.DataFrame({"Ticker": ["AAPL"]}), "spy", tmp_path)
     save_holdings(pl.DataFrame({"Ticker": ["TEST"]}), "test", tmp_path)
 
@@ -180,19 +282,34 @@ def test_write_metadata(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None
     assert metadata["watchlists"]["nasdaq100"]["source_url"] == catalog.ETF_CONFIGS["qqq"].url
 
 
-@patch("index_etfs.outputs.tradingview_symbols", return_value={})
-def test_get_etf_holdings_downloads_cleans_and_writes(_mock_symbols: MagicMock, tmp_path: Path) -> None:
+def test_get_etf_holdings_downloads_cleans_and_writes(holdings_mocks: SimpleNamespace, tmp_path: Path) -> None:
     rows = [{"symbol": f"TICK{i}"} for i in range(100)]
-    payload = json.dumps({"data": {"data": {"rows": rows}}}).encode()
+    holdings_mocks.read_url.return_value = io.BytesIO(json.dumps({"data": {"data": {"rows": rows}}}).encode())
 
-    with patch("index_etfs.sources.read_url", return_value=io.BytesIO(payload)):
-        result = get_etf_holdings("QQQ", tmp_path)
+    result = get_etf_holdings("QQQ", tmp_path)
 
     assert len(result) == 100
+    holdings_mocks.read_url.assert_called_once_with(catalog.ETF_CONFIGS["qqq"].url)
     assert (tmp_path / "tickers" / "qqq.txt").read_text().startswith("TICK0\n")
     assert (tmp_path / "watchlists" / "nasdaq100.txt").exists()
 
 
+@pytest.mark.parametrize("symbol", catalog.ETF_CONFIGS)
+def test_get_etf_holdings_uses_provider_loader(
+    symbol: str, holdings_mocks: SimpleNamespace, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    config = catalog.ETF_CONFIGS[symbol]
+    columns = {"Ticker": [f"T{i}" for i in range(config.expected_count)]}
+    if currency_col := CURRENCY_COLUMNS.get(config.provider):
+        columns[currency_col] = ["USD"] * config.expected_count
+    loader = MagicMock(return_value=pl.DataFrame(columns))
+    monkeypatch.setitem(PROVIDER_LOADERS, config.provider, loader)
+
+    assert len(get_etf_holdings(symbol, tmp_path)) == config.expected_count
+    loader.assert_called_once_with(config.url)
+    assert (tmp_path / "tickers" / f"{symbol}.txt").exists()
+
+
 def test_get_etf_holdings_rejects_unknown_symbol() -> None:
     with pytest.raises(ValueError, match="Unknown ETF symbol"):
         get_etf_holdings("INVALID")
@@ -206,15 +323,20 @@ def test_validate_count_rejects_empty_and_tiny_results() -> None:
     validate_count("iwm", 1800)
 
 
-@patch("index_etfs.holdings.write_metadata")
-@patch("index_etfs.holdings.get_etf_holdings")
-def test_main_downloads_all_configured_etfs(mock_get_holdings: MagicMock, mock_write_metadata: MagicMock) -> None:
-    mock_get_holdings.side_effect = [
-        pl.DataFrame({"Ticker": range(config.expected_count)})
-        for config in catalog.ETF_CONFIGS.values()
-    ]
+def test_main_downloads_all_configured_etfs(monkeypatch: pytest.MonkeyPatch) -> None:
+    mock_get_holdings = MagicMock(
+        side_effect=lambda symbol, _output_dir: pl.DataFrame(
+            {"Ticker": range(catalog.ETF_CONFIGS[symbol].expected_count)}
+        )
+    )
+    mock_write_metadata = MagicMock()
+    monkeypatch.setattr(holdings, "get_etf_holdings", mock_get_holdings)
+    monkeypatch.setattr(holdings, "write_metadata", mock_write_metadata)
 
     holdings.main()
 
     assert mock_get_holdings.call_count == len(catalog.ETF_CONFIGS)
     mock_write_metadata.assert_called_once()
+    assert mock_write_metadata.call_args.args[0] == {
+        symbol: config.expected_count for symbol, config in catalog.ETF_CONFIGS.items()
+    }